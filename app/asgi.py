@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Xfce Desktop Environment for HuggingFace Spaces
+ASGI Application: Flask routes plus the WebSocket terminal
+"""
+
+import os
+import asyncio
+import codecs
+import collections
+import fcntl
+import hmac
+import json
+import pty
+import signal
+import struct
+import subprocess
+import termios
+from urllib.parse import urlsplit
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from app.main import (app as flask_app, active_display, check_desktop_status,
+                      log_message, VNC_PASSWORD)
+
+SHELL = os.environ.get('SHELL', '/bin/bash')
+TERMINAL_AUTH_TIMEOUT = 30.0
+# Stop reading from the WebSocket while this much input waits for the shell
+TERMINAL_INPUT_HIGH_WATER = 65536
+# Largest output message sent to the browser
+TERMINAL_FRAME_SIZE = 65536
+# Stop reading from the pty while this much output waits for the network
+TERMINAL_OUTPUT_HIGH_WATER = 262144
+
+# Status is checked once per interval per worker and pushed to every subscriber
+STATUS_PUSH_INTERVAL = 2.0
+STATUS_KEEPALIVE = 15.0
+_status_subscribers = set()
+_status_publisher = None
+_last_status = None
+
+
+def spawn_shell(tty_fd):
+    """Start an interactive login shell attached to a pseudo-terminal"""
+    env = os.environ.copy()
+    env['TERM'] = 'xterm-256color'
+    # GUI programs open on the desktop's current display, which moves on failover
+    env['DISPLAY'] = active_display()
+
+    # setsid --ctty gives the shell its own session with the pty as controlling
+    # terminal, which job control needs
+    return subprocess.Popen(
+        ["setsid", "--ctty", "--wait", SHELL, "-l"],
+        stdin=tty_fd,
+        stdout=tty_fd,
+        stderr=tty_fd,
+        cwd=os.path.expanduser('~'),
+        env=env
+    )
+
+
+def _same_origin(websocket):
+    """Reject WebSocket handshakes started by pages on other sites"""
+    origin = websocket.headers.get('origin')
+    # Browsers always send Origin; other clients still need the password
+    return origin is None or urlsplit(origin).netloc == websocket.headers.get('host')
+
+
+async def _authenticate(websocket):
+    """Wait for the client's auth message and check it against VNC_PASSWORD"""
+    try:
+        message = json.loads(await asyncio.wait_for(websocket.receive_text(),
+                                                    TERMINAL_AUTH_TIMEOUT))
+        password = message['password'] if message.get('type') == 'auth' else ''
+    except (WebSocketDisconnect, asyncio.TimeoutError, ValueError,
+            KeyError, TypeError, AttributeError):
+        return False
+    return isinstance(password, str) and hmac.compare_digest(
+        password.encode('utf-8'), VNC_PASSWORD.encode('utf-8'))
+
+
+def set_window_size(tty_fd, rows, cols):
+    """Set the pty window size, which signals SIGWINCH to the shell"""
+    if not (isinstance(rows, int) and isinstance(cols, int)
+            and 0 < rows < 10000 and 0 < cols < 10000):
+        return
+    fcntl.ioctl(tty_fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+
+async def terminal_socket(websocket: WebSocket):
+    """Relay between a WebSocket and a shell running on a pseudo-terminal"""
+    if not _same_origin(websocket):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    # The shell is only started once the client proved it knows the password
+    if not await _authenticate(websocket):
+        try:
+            await websocket.close(code=1008)
+        except RuntimeError:
+            pass
+        return
+
+    master_fd, slave_fd = pty.openpty()
+    try:
+        shell = spawn_shell(slave_fd)
+    except OSError as e:
+        log_message(f"Error starting terminal shell: {e}")
+        os.close(master_fd)
+        await websocket.close()
+        return
+    finally:
+        os.close(slave_fd)
+
+    # Never block the event loop on the pty
+    os.set_blocking(master_fd, False)
+    loop = asyncio.get_running_loop()
+    output = collections.deque()
+    output_bytes = 0
+    output_ready = asyncio.Event()
+    reading = True
+    shell_exited = False
+    pending_input = bytearray()
+    input_drained = asyncio.Event()
+    input_drained.set()
+
+    def read_output():
+        nonlocal output_bytes, reading, shell_exited
+        try:
+            data = os.read(master_fd, TERMINAL_FRAME_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if data:
+            output.append(data)
+            output_bytes += len(data)
+        else:
+            # The shell exited and the pty hung up
+            shell_exited = True
+        if shell_exited or output_bytes > TERMINAL_OUTPUT_HIGH_WATER:
+            # Let the pty fill up so the shell blocks until the client catches up
+            loop.remove_reader(master_fd)
+            reading = False
+        output_ready.set()
+
+    async def send_output():
+        nonlocal output_bytes, reading
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            await output_ready.wait()
+            # Coalesce queued output, but never beyond one frame
+            frame = bytearray()
+            while output and (not frame or len(frame) + len(output[0]) <= TERMINAL_FRAME_SIZE):
+                frame += output.popleft()
+            output_bytes -= len(frame)
+            if not output:
+                output_ready.clear()
+            if not reading and not shell_exited and output_bytes <= TERMINAL_OUTPUT_HIGH_WATER // 2:
+                loop.add_reader(master_fd, read_output)
+                reading = True
+
+            text = decoder.decode(bytes(frame))
+            if text:
+                await websocket.send_text(text)
+            if shell_exited and not output:
+                await websocket.close()
+                return
+
+    def write_input():
+        try:
+            written = os.write(master_fd, pending_input)
+        except BlockingIOError:
+            written = 0
+        except OSError:
+            # The shell is gone, so the input has nowhere to go
+            written = len(pending_input)
+        del pending_input[:written]
+        if pending_input:
+            if input_drained.is_set():
+                input_drained.clear()
+                loop.add_writer(master_fd, write_input)
+        elif not input_drained.is_set():
+            loop.remove_writer(master_fd)
+            input_drained.set()
+
+    loop.add_reader(master_fd, read_output)
+    sender = asyncio.create_task(send_output())
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            if message.get('type') == 'input':
+                pending_input.extend(message['data'].encode('utf-8'))
+                write_input()
+                if len(pending_input) > TERMINAL_INPUT_HIGH_WATER:
+                    await input_drained.wait()
+            elif message.get('type') == 'resize':
+                set_window_size(master_fd, message['rows'], message['cols'])
+    except (WebSocketDisconnect, RuntimeError, OSError,
+            ValueError, KeyError, TypeError, AttributeError):
+        pass
+    finally:
+        loop.remove_reader(master_fd)
+        loop.remove_writer(master_fd)
+        sender.cancel()
+        os.close(master_fd)
+        try:
+            os.killpg(shell.pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+        await asyncio.to_thread(shell.wait)
+
+
+async def publish_status():
+    """Check desktop status periodically and push changes to subscribers"""
+    global _status_publisher, _last_status
+    try:
+        while _status_subscribers:
+            status = await asyncio.to_thread(check_desktop_status)
+            if status != _last_status:
+                _last_status = status
+                for queue in _status_subscribers:
+                    queue.put_nowait(status)
+            await asyncio.sleep(STATUS_PUSH_INTERVAL)
+    finally:
+        # Stop checking while nobody is listening
+        _status_publisher = None
+
+
+async def status_stream(request):
+    """Server-sent events stream of desktop status"""
+    global _status_publisher
+
+    queue = asyncio.Queue()
+    if _last_status is not None:
+        queue.put_nowait(_last_status)
+    _status_subscribers.add(queue)
+    if _status_publisher is None:
+        _status_publisher = asyncio.create_task(publish_status())
+
+    async def events():
+        try:
+            while True:
+                try:
+                    status = await asyncio.wait_for(queue.get(), STATUS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(status)}\n\n"
+        finally:
+            _status_subscribers.discard(queue)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+app = Starlette(routes=[
+    Route('/api/status/stream', status_stream),
+    WebSocketRoute('/ws', terminal_socket),
+    Mount('/', WSGIMiddleware(flask_app)),
+])
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Xfce Desktop Environment for HuggingFace Spaces
+Command launcher: runs short-lived helper commands for the main application
+
+Reads JSON-encoded argument lists, one per line, from the socket inherited
+as file descriptor argv[1] and answers each with a JSON line holding the
+exit status. Exits when the main application closes its end.
+"""
+
+import os
+import sys
+import json
+import socket
+
+# Send helper output to /dev/null in the spawned child
+DEVNULL_FILE_ACTIONS = [
+    (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+    (os.POSIX_SPAWN_DUP2, 1, 2),
+]
+
+
+def run(command):
+    """Run a command to completion and describe how it ended"""
+    try:
+        pid = os.posix_spawnp(command[0], command, os.environ,
+                              file_actions=DEVNULL_FILE_ACTIONS, setsid=True)
+    except OSError as e:
+        return {"error": str(e)}
+    _, status = os.waitpid(pid, 0)
+    return {"returncode": os.waitstatus_to_exitcode(status)}
+
+
+def main():
+    sock = socket.socket(fileno=int(sys.argv[1]))
+    with sock, sock.makefile('rb') as requests:
+        for line in requests:
+            reply = run(json.loads(line))
+            sock.sendall(json.dumps(reply).encode('utf-8') + b"\n")
+
+
+if __name__ == '__main__':
+    main()
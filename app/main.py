@@ -6,11 +6,17 @@ Main Flask Application
 
 import os
 import sys
+import atexit
+import gzip
+import hashlib
+import json
+import socket
 import subprocess
 import signal
 import time
 import threading
-from flask import Flask, render_template, redirect, url_for, jsonify, send_from_directory
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, redirect, url_for, jsonify, request, send_from_directory
 
 # Configuration
 app = Flask(__name__)
@@ -20,12 +26,46 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'huggingface-spaces-secr
 VNC_PASSWORD = os.environ.get('VNC_PASSWORD', 'huggingface')
 RESOLUTION = os.environ.get('RESOLUTION', '1280x720')
 VNC_PORT = os.environ.get('VNC_PORT', '5900')
+WEBSOCKIFY_PORT = 6080
+
+# Xvfb alternates between these displays when a hot spare is promoted
+DISPLAYS = (':1', ':2')
+SPARE_CHECK_INTERVAL = 10
+# Records the active display for processes that did not spawn Xvfb
+DISPLAY_FILE = '/tmp/.desktop-display'
 
 # Global process references
 xvfb_process = None
 x11vnc_process = None
 xfce_process = None
 websockify_process = None
+xvfb_spare_process = None
+
+# Display currently used by Xfce and x11vnc
+_display = DISPLAYS[0]
+_stopping = threading.Event()
+_spare_lock = threading.RLock()
+
+# PID of the process that spawned the desktop processes and must reap them
+_owner_pid = None
+
+# Status results are reused for a short while to absorb polling bursts
+STATUS_CACHE_TTL = 2.0
+_status_cache = (0.0, None)
+_status_lock = threading.Lock()
+# Set once x11vnc and websockify have accepted connections
+_ports_ready = False
+
+# Rendered pages keyed by template name: (etag, {encoding: body})
+_pages = {}
+STATIC_TEMPLATES = ('booting.html', 'desktop.html', 'terminal.html', 'terminal_client.html')
+
+# Helper process that runs short-lived commands: (Popen, socket, reader)
+LAUNCHER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'launcher.py')
+_launcher = None
+_launcher_lock = threading.Lock()
+# Readers left behind by fork, which must never be closed or finalized
+_abandoned_readers = []
 
 
 def log_message(message):
@@ -33,53 +73,208 @@ def log_message(message):
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
 
 
-def run_command(command, wait=True, shell=False):
+# Send short-lived helper output to /dev/null in the spawned child
+_DEVNULL_FILE_ACTIONS = [
+    (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+    (os.POSIX_SPAWN_DUP2, 1, 2),
+]
+
+
+def _start_launcher():
+    """Start the command launcher helper connected over a socket pair"""
+    ours, theirs = socket.socketpair()
+    ours.set_inheritable(False)
+    with theirs:
+        process = subprocess.Popen(
+            [sys.executable, LAUNCHER_SCRIPT, str(theirs.fileno())],
+            pass_fds=(theirs.fileno(),),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    return process, ours, ours.makefile('rb')
+
+
+def _close_launcher():
+    """Drop our end of the launcher connection, which makes the launcher exit"""
+    global _launcher
+    if _launcher is not None:
+        _, sock, reader = _launcher
+        reader.close()
+        sock.close()
+        _launcher = None
+
+
+def _forget_launcher_after_fork():
+    """Keep forked children from holding the launcher open"""
+    global _launcher, _launcher_lock
+    _launcher_lock = threading.Lock()
+    if _launcher is not None:
+        _, sock, reader = _launcher
+        # Another thread may have been inside reader.readline() at fork time,
+        # leaving the reader's lock held forever in this process. Release only
+        # the descriptor and keep the reader alive so it is never closed.
+        _abandoned_readers.append(reader)
+        os.close(sock.detach())
+        _launcher = None
+
+
+os.register_at_fork(after_in_child=_forget_launcher_after_fork)
+
+
+def stop_launcher(timeout=1.0):
+    """Shut down the command launcher"""
+    with _launcher_lock:
+        if _launcher is None:
+            return
+        process = _launcher[0]
+        _close_launcher()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _launch(command):
+    """Run a command to completion in the launcher and return its exit code"""
+    global _launcher
+    with _launcher_lock:
+        # Restart the launcher lazily if it died
+        if _launcher is not None and _launcher[0].poll() is not None:
+            _close_launcher()
+        if _launcher is None:
+            _launcher = _start_launcher()
+        _, sock, reader = _launcher
+        try:
+            sock.sendall(json.dumps(command).encode('utf-8') + b"\n")
+            reply = reader.readline()
+        except OSError:
+            reply = b''
+        if not reply:
+            _close_launcher()
+            raise ConnectionError("command launcher exited")
+    
+    reply = json.loads(reply)
+    if "error" in reply:
+        raise OSError(reply["error"])
+    return reply["returncode"]
+
+
+def run_command(command, wait=True):
     """Execute a command and return the process"""
     try:
-        if shell:
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                preexec_fn=os.setsid
-            )
-        else:
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                preprocess=os.setsid
-            )
-        
         if wait:
-            process.wait()
-            return process.returncode == 0
+            try:
+                return _launch(command) == 0
+            except ConnectionError:
+                pass
+            
+            # posix_spawn skips duplicating this process's page tables like fork() does
+            pid = os.posix_spawnp(command[0], command, os.environ,
+                                  file_actions=_DEVNULL_FILE_ACTIONS, setsid=True)
+            try:
+                _, status = os.waitpid(pid, 0)
+            except ChildProcessError:
+                # gunicorn's SIGCHLD handler reaped it first and the status is
+                # lost; assume success like subprocess does
+                return True
+            return os.waitstatus_to_exitcode(status) == 0
+        
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
         return process
     except Exception as e:
         log_message(f"Error running command: {e}")
         return False
 
 
+def _wait_for(probe, timeout=5.0, interval=0.02):
+    """Poll probe until it returns True or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if probe():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def _can_connect(address, family=socket.AF_INET):
+    """Return True if something is accepting connections at address"""
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(0.05)
+            sock.connect(address)
+        return True
+    except OSError:
+        return False
+
+
+def _kill_group(process):
+    """Kill the process group led by a spawned process"""
+    if process is None:
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.wait()
+
+
+def _spawn_xvfb(display):
+    """Launch Xvfb on the given display"""
+    return subprocess.Popen(
+        ["Xvfb", display, "-screen", "0", f"{RESOLUTION}x24", "-ac", "+extension", "GLX"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+
+def _wait_for_display(display):
+    """Wait until the X server for display accepts connections"""
+    # A stale socket file may be left behind, so probe with a connection
+    x_socket = f"/tmp/.X11-unix/X{display.lstrip(':')}"
+    return _wait_for(lambda: _can_connect(x_socket, socket.AF_UNIX))
+
+
+def _set_display(display):
+    """Switch the active display and publish it to other processes"""
+    global _display
+    _display = display
+    temp_file = f"{DISPLAY_FILE}.{os.getpid()}"
+    with open(temp_file, 'w') as f:
+        f.write(display)
+    os.replace(temp_file, DISPLAY_FILE)
+
+
+def active_display():
+    """Return the display currently used by the desktop"""
+    try:
+        with open(DISPLAY_FILE) as f:
+            return f.read().strip()
+    except OSError:
+        return DISPLAYS[0]
+
+
 def start_xvfb():
     """Start virtual framebuffer"""
     global xvfb_process
     log_message("Starting Xvfb...")
     
     # Kill any existing Xvfb processes
-    run_command("pkill -9 Xvfb", wait=False, shell=True)
-    time.sleep(1)
+    run_command(["pkill", "-9", "Xvfb"])
     
-    # Start Xvfb on display :1
-    xvfb_process = subprocess.Popen(
-        ["Xvfb", ":1", "-screen", "0", f"{RESOLUTION}x24", "-ac", "+extension", "GLX"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        preexec_fn=os.setsid
-    )
+    _set_display(_display)
+    xvfb_process = _spawn_xvfb(_display)
     
-    time.sleep(2)
-    log_message(f"Xvfb started on display :1")
+    if not _wait_for_display(_display):
+        log_message(f"Xvfb did not become ready on display {_display}")
+        return False
+    log_message(f"Xvfb started on display {_display}")
     return True
 
 
@@ -88,20 +283,22 @@ def start_xfce():
     global xfce_process
     log_message("Starting Xfce4...")
     
+    # Stop a session left over from a previous display
+    _kill_group(xfce_process)
+    
     # Set display environment variable
     env = os.environ.copy()
-    env['DISPLAY'] = ':1'
+    env['DISPLAY'] = _display
     
     # Start Xfce4
     xfce_process = subprocess.Popen(
         ["startxfce4"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
         env=env,
-        preexec_fn=os.setsid
+        start_new_session=True
     )
     
-    time.sleep(3)
     log_message("Xfce4 started")
     return True
 
@@ -121,14 +318,13 @@ def start_vnc_server():
         log_message(f"Error creating password file: {e}")
     
     # Kill any existing x11vnc processes
-    run_command("pkill -9 x11vnc", wait=False, shell=True)
-    time.sleep(1)
+    run_command(["pkill", "-9", "x11vnc"])
     
     # Start x11vnc
     x11vnc_process = subprocess.Popen(
         [
             "x11vnc",
-            "-display", ":1",
+            "-display", _display,
             "-localhost",
             "-forever",
             "-shared",
@@ -137,12 +333,14 @@ def start_vnc_server():
             "-o", "/tmp/x11vnc.log",
             "-bg"
         ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        preexec_fn=os.setsid
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
     )
     
-    time.sleep(2)
+    if not _wait_for(lambda: _can_connect(('127.0.0.1', int(VNC_PORT)))):
+        log_message(f"x11vnc did not start listening on port {VNC_PORT}")
+        return False
     log_message(f"x11vnc started on port {VNC_PORT}")
     return True
 
@@ -153,62 +351,164 @@ def start_websockify():
     log_message("Starting websockify...")
     
     # Kill any existing websockify processes
-    run_command("pkill -9 websockify", wait=False, shell=True)
-    time.sleep(1)
+    run_command(["pkill", "-9", "websockify"])
     
     # Start websockify
     websockify_process = subprocess.Popen(
-        ["websockify", "--web", "/home/user/novnc", "6080", "localhost:5900"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        preexec_fn=os.setsid
+        ["websockify", "--web", "/home/user/novnc", str(WEBSOCKIFY_PORT), f"localhost:{VNC_PORT}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
     )
     
-    time.sleep(2)
-    log_message("websockify started on port 6080")
+    if not _wait_for(lambda: _can_connect(('127.0.0.1', WEBSOCKIFY_PORT))):
+        log_message(f"websockify did not start listening on port {WEBSOCKIFY_PORT}")
+        return False
+    log_message(f"websockify started on port {WEBSOCKIFY_PORT}")
     return True
 
 
 def start_desktop_environment():
     """Initialize the complete desktop environment"""
+    global _owner_pid
     log_message("Initializing desktop environment...")
+    _owner_pid = os.getpid()
     
-    # Start components in order
-    start_xvfb()
-    start_xfce()
-    start_vnc_server()
-    start_websockify()
+    # Xfce and x11vnc only need the display, so they start side by side
+    ready = start_xvfb()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        xfce = executor.submit(start_xfce)
+        vnc = executor.submit(start_vnc_server)
+        ready = xfce.result() and vnc.result() and ready
+    ready = start_websockify() and ready
     
-    log_message("Desktop environment ready!")
-    return True
-
-
-def check_desktop_status():
-    """Check if desktop environment is running"""
+    if ready:
+        log_message("Desktop environment ready!")
+    else:
+        log_message("Desktop environment started with errors")
+    
+    supervisor_thread = threading.Thread(target=supervise_desktop, daemon=True)
+    supervisor_thread.start()
+    spare_thread = threading.Thread(target=maintain_spare, daemon=True)
+    spare_thread.start()
+    return ready
+
+
+def _ensure_spare():
+    """Keep an idle Xvfb running on the other display"""
+    global xvfb_spare_process
+    with _spare_lock:
+        if xvfb_spare_process is None or xvfb_spare_process.poll() is not None:
+            spare_display = DISPLAYS[1] if _display == DISPLAYS[0] else DISPLAYS[0]
+            xvfb_spare_process = _spawn_xvfb(spare_display)
+
+
+def _promote_spare():
+    """Replace a dead Xvfb with the spare and reattach Xfce and x11vnc"""
+    global xvfb_process, xvfb_spare_process
+    log_message(f"Xvfb on display {_display} exited, promoting spare...")
+    
+    _kill_group(xvfb_process)
+    with _spare_lock:
+        _ensure_spare()
+        xvfb_process, xvfb_spare_process = xvfb_spare_process, None
+        _set_display(DISPLAYS[1] if _display == DISPLAYS[0] else DISPLAYS[0])
+        # Start the next spare on the display that just died
+        _ensure_spare()
+    
+    if not _wait_for_display(_display):
+        log_message(f"Spare Xvfb did not become ready on display {_display}")
+        return False
+    
+    # websockify only talks to the VNC port, so it keeps running
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        xfce = executor.submit(start_xfce)
+        vnc = executor.submit(start_vnc_server)
+        return xfce.result() and vnc.result()
+
+
+def supervise_desktop():
+    """Fail over to the spare Xvfb as soon as the active one exits"""
+    while not _stopping.is_set():
+        xvfb_process.wait()
+        if _stopping.is_set():
+            return
+        if not _promote_spare():
+            # Back off instead of cycling through displays that fail to start
+            _stopping.wait(1.0)
+
+
+def maintain_spare():
+    """Keep the spare Xvfb running"""
+    while not _stopping.is_set():
+        _ensure_spare()
+        _stopping.wait(SPARE_CHECK_INTERVAL)
+
+
+def stop_desktop_environment(grace=1.0):
+    """Terminate the process group of every desktop component"""
+    # Forked workers inherit the process handles but do not own them
+    if os.getpid() != _owner_pid or _stopping.is_set():
+        return
+    _stopping.set()
+    
+    processes = [p for p in (websockify_process, x11vnc_process, xfce_process,
+                             xvfb_process, xvfb_spare_process)
+                 if p is not None]
+    log_message("Stopping desktop environment...")
+    
+    # Each component runs in its own session, so its pid is also its pgid
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for process in processes:
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                pass
+        if sig == signal.SIGTERM:
+            deadline = time.monotonic() + grace
+            for process in processes:
+                try:
+                    process.wait(timeout=max(0.0, deadline - time.monotonic()))
+                except subprocess.TimeoutExpired:
+                    pass
+    
+    # x11vnc -bg daemonizes into a session of its own
+    run_command(["pkill", "-9", "x11vnc"])
+    stop_launcher()
+
+
+atexit.register(stop_desktop_environment)
+
+
+def _running(names):
+    """Scan /proc once and return the command lines of processes with the given names"""
+    found = {name: [] for name in names}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry.name}/comm') as f:
+                comm = f.read().strip()
+        except OSError:
+            continue
+        if comm in found:
+            try:
+                with open(f'/proc/{entry.name}/cmdline', 'rb') as f:
+                    found[comm].append(f.read().decode(errors='replace').split('\0'))
+            except OSError:
+                continue
+    return found
+
+
+def _scan_desktop_status():
+    """Check which desktop components are running"""
     try:
-        # Check if Xvfb is running
-        result = subprocess.run(
-            ["pgrep", "-f", "Xvfb"],
-            capture_output=True,
-            text=True
-        )
-        xvfb_running = result.returncode == 0
-        
-        # Check if x11vnc is running
-        result = subprocess.run(
-            ["pgrep", "-f", "x11vnc"],
-            capture_output=True,
-            text=True
-        )
-        vnc_running = result.returncode == 0
-        
-        # Check if websockify is running
-        result = subprocess.run(
-            ["pgrep", "-f", "websockify"],
-            capture_output=True,
-            text=True
-        )
-        ws_running = result.returncode == 0
+        running = _running({"Xvfb", "x11vnc", "websockify"})
+        # Only the Xvfb on the active display counts, not the hot spare
+        display = active_display()
+        xvfb_running = any(display in argv[1:] for argv in running["Xvfb"])
+        vnc_running = bool(running["x11vnc"])
+        ws_running = bool(running["websockify"])
         
         return {
             "xvfb": xvfb_running,
@@ -221,115 +521,118 @@ def check_desktop_status():
         return {"error": str(e)}
 
 
+def _cached_status():
+    """Return the cached status if it is still fresh"""
+    cached_at, cached = _status_cache
+    if cached is not None and time.monotonic() - cached_at < STATUS_CACHE_TTL:
+        return cached
+    return None
+
+
+def check_desktop_status():
+    """Check if desktop environment is running"""
+    global _status_cache
+    
+    status = _cached_status()
+    if status is not None:
+        return status
+    
+    # Concurrent callers wait for a single scan instead of each running one
+    with _status_lock:
+        status = _cached_status()
+        if status is None:
+            status = _scan_desktop_status()
+            if "error" not in status:
+                _status_cache = (time.monotonic(), status)
+    return status
+
+
+def desktop_ready():
+    """Return True once x11vnc and websockify accept connections"""
+    global _ports_ready
+    # After the first successful probe the cached process scan is enough
+    if _ports_ready:
+        _ports_ready = check_desktop_status().get("ready", False)
+        return _ports_ready
+    _ports_ready = (_can_connect(('127.0.0.1', int(VNC_PORT)))
+                    and _can_connect(('127.0.0.1', WEBSOCKIFY_PORT)))
+    return _ports_ready
+
+
+def _compress_page(body):
+    """Encode a page once in every supported content encoding"""
+    etag = hashlib.sha1(body).hexdigest()
+    return etag, {'identity': body, 'gzip': gzip.compress(body, 6)}
+
+
+def serve_page(template, **context):
+    """Serve a template rendered once and cached in precompressed form"""
+    page = _pages.get(template)
+    if page is None:
+        # Page contexts only depend on startup configuration
+        html = render_template(template, **context)
+        page = _pages[template] = _compress_page(html.encode('utf-8'))
+    etag, bodies = page
+    
+    encoding = 'gzip' if request.accept_encodings['gzip'] else 'identity'
+    etag = f"{etag}-{encoding}"
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'public, max-age=300',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(bodies[encoding], mimetype='text/html', headers=headers)
+
+
+def _load_page(template):
+    """Read a template that has no variables, bypassing Jinja"""
+    with open(os.path.join(app.root_path, app.template_folder, template), 'rb') as f:
+        return _compress_page(f.read())
+
+
+# Templates without variables are served verbatim from memory
+_pages.update({template: _load_page(template) for template in STATIC_TEMPLATES})
+
+
 # Flask routes
 @app.route('/')
 def index():
     """Main landing page"""
-    return render_template('index.html',
-                           vnc_password=VNC_PASSWORD,
-                           resolution=RESOLUTION)
+    return serve_page('index.html',
+                      vnc_password=VNC_PASSWORD,
+                      resolution=RESOLUTION)
 
 
 @app.route('/desktop')
 def desktop():
     """Desktop interface via noVNC"""
-    return render_template('desktop.html')
+    if not desktop_ready():
+        # Show a placeholder that retries until startup finishes
+        response = serve_page('booting.html')
+        response.status_code = 503
+        response.headers['Retry-After'] = '2'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    # Revalidate every visit so a restarted desktop goes through the gate again
+    response = serve_page('desktop.html')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 @app.route('/terminal')
 def terminal():
     """Terminal interface"""
-    return render_template('terminal.html')
+    return serve_page('terminal.html')
 
 
 @app.route('/terminal.html')
 def terminal_html():
     """Terminal HTML page with xterm.js"""
-    return '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Terminal - HuggingFace Spaces</title>
-    <script src="https://cdn.jsdelivr.net/npm/xterm@5.3.0/lib/xterm.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/xterm-addon-fit@0.8.0/lib/xterm-addon-fit.min.js"></script>
-    <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/xterm@5.3.0/css/xterm.css">
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { 
-            background: #1a1a1a; 
-            height: 100vh; 
-            display: flex;
-            flex-direction: column;
-        }
-        #terminal { 
-            flex: 1; 
-            padding: 10px; 
-            background: #000;
-        }
-        .toolbar {
-            background: linear-gradient(90deg, #1a1a2e, #16213e);
-            padding: 10px 20px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            border-bottom: 1px solid #333;
-        }
-        .toolbar-title { color: #fff; font-size: 1.1em; }
-        .toolbar-links a {
-            color: #00d4ff;
-            text-decoration: none;
-            padding: 8px 16px;
-            border-radius: 6px;
-            background: rgba(0, 212, 255, 0.1);
-        }
-    </style>
-</head>
-<body>
-    <div class="toolbar">
-        <div class="toolbar-title">Terminal - HuggingFace Spaces</div>
-        <div class="toolbar-links">
-            <a href="/">Home</a>
-            <a href="/desktop">Desktop</a>
-        </div>
-    </div>
-    <div id="terminal"></div>
-    <script>
-        const term = new Terminal({
-            cursorBlink: true,
-            fontSize: 14,
-            fontFamily: 'Menlo, Monaco, "Courier New", monospace',
-            theme: {
-                background: '#1a1a1a',
-                foreground: '#ffffff'
-            }
-        });
-        const fitAddon = new FitAddon.FitAddon();
-        term.loadAddon(fitAddon);
-        term.open(document.getElementById('terminal'));
-        fitAddon.fit();
-        
-        // Simple WebSocket terminal connection
-        const ws = new WebSocket(`ws://${location.host}/ws`);
-        ws.onopen = () => {
-            term.write('\\r\\nConnected to terminal\\r\\n\\r\\n$ ');
-        };
-        ws.onmessage = (event) => {
-            term.write(event.data);
-        };
-        ws.onclose = () => {
-            term.write('\\r\\nConnection closed\\r\\n');
-        };
-        term.onData((data) => {
-            ws.send(data);
-        });
-        
-        window.addEventListener('resize', () => fitAddon.fit());
-    </script>
-</body>
-</html>
-'''
+    return serve_page('terminal_client.html')
 
 
 @app.route('/api/status')
@@ -341,537 +644,38 @@ def api_status():
 
 @app.route('/novnc/<path:filename>')
 def novnc_files(filename):
-    """Serve noVNC static files"""
+    """Serve noVNC static files (nginx serves /novnc/ directly in production)"""
     return send_from_directory('/home/user/novnc', filename)
 
 
 @app.route('/vnc.html')
 def vnc_client():
     """Redirect to noVNC client"""
-    return render_template('vnc.html')
+    return redirect('/novnc/vnc.html')
 
 
-def create_template_files():
-    """Create template directory and files"""
-    os.makedirs('/workspace/app/templates', exist_ok=True)
-    
-    # Create index.html template
-    index_html = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>HuggingFace Spaces - Xfce Desktop</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, sans-serif;
-            background: linear-gradient(135deg, #1a1a2e 0%, #16213e 100%);
-            min-height: 100vh;
-            color: #fff;
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 40px 20px;
-        }
-        
-        header {
-            text-align: center;
-            margin-bottom: 60px;
-        }
-        
-        h1 {
-            font-size: 3em;
-            margin-bottom: 10px;
-            background: linear-gradient(90deg, #00d4ff, #7b2cbf);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-        }
-        
-        .subtitle {
-            color: #a0a0a0;
-            font-size: 1.2em;
-        }
-        
-        .status-card {
-            background: rgba(255, 255, 255, 0.1);
-            border-radius: 16px;
-            padding: 30px;
-            margin-bottom: 40px;
-            backdrop-filter: blur(10px);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-        }
-        
-        .status-indicator {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            font-size: 1.1em;
-        }
-        
-        .status-dot {
-            width: 12px;
-            height: 12px;
-            border-radius: 50%;
-            background: #00ff88;
-            animation: pulse 2s infinite;
-        }
-        
-        @keyframes pulse {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.5; }
-        }
-        
-        .cards {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 30px;
-            margin-top: 40px;
-        }
-        
-        .card {
-            background: rgba(255, 255, 255, 0.05);
-            border-radius: 20px;
-            padding: 40px 30px;
-            text-align: center;
-            transition: all 0.3s ease;
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            cursor: pointer;
-            text-decoration: none;
-            color: inherit;
-        }
-        
-        .card:hover {
-            transform: translateY(-5px);
-            background: rgba(255, 255, 255, 0.1);
-            box-shadow: 0 20px 40px rgba(0, 0, 0, 0.3);
-        }
-        
-        .card-icon {
-            font-size: 4em;
-            margin-bottom: 20px;
-        }
-        
-        .card h2 {
-            font-size: 1.5em;
-            margin-bottom: 15px;
-        }
-        
-        .card p {
-            color: #a0a0a0;
-            line-height: 1.6;
-        }
-        
-        .info-grid {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 20px;
-            margin-top: 30px;
-        }
-        
-        .info-item {
-            background: rgba(255, 255, 255, 0.05);
-            padding: 20px;
-            border-radius: 12px;
-            text-align: center;
-        }
-        
-        .info-label {
-            color: #a0a0a0;
-            font-size: 0.9em;
-            margin-bottom: 5px;
-        }
-        
-        .info-value {
-            font-size: 1.2em;
-            font-weight: bold;
-            color: #00d4ff;
-        }
-        
-        footer {
-            text-align: center;
-            margin-top: 60px;
-            padding: 20px;
-            color: #666;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <header>
-            <h1>Xfce Desktop Environment</h1>
-            <p class="subtitle">HuggingFace Spaces - Browser-based Linux Desktop</p>
-        </header>
-        
-        <div class="status-card">
-            <div class="status-indicator">
-                <div class="status-dot"></div>
-                <span>Desktop Environment Ready</span>
-            </div>
-            <div class="info-grid">
-                <div class="info-item">
-                    <div class="info-label">Resolution</div>
-                    <div class="info-value">{{ resolution }}</div>
-                </div>
-                <div class="info-item">
-                    <div class="info-label">VNC Port</div>
-                    <div class="info-value">5900</div>
-                </div>
-                <div class="info-item">
-                    <div class="info-label">Web Interface</div>
-                    <div class="info-value">Port 6080</div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="cards">
-            <a href="/desktop" class="card">
-                <div class="card-icon">🖥️</div>
-                <h2>Launch Xfce Desktop</h2>
-                <p>Access the full Xfce4 desktop environment in your browser. Includes file manager, terminal, and more.</p>
-            </a>
-            
-            <a href="/terminal" class="card">
-                <div class="card-icon">⌨️</div>
-                <h2>Launch Terminal</h2>
-                <p>Use the web-based terminal for command-line access to your Linux environment.</p>
-            </a>
-        </div>
-        
-        <footer>
-            <p>Powered by HuggingFace Spaces | Xfce4 Desktop Environment</p>
-        </footer>
-    </div>
-    
-    <script>
-        // Check desktop status periodically
-        async function checkStatus() {
-            try {
-                const response = await fetch('/api/status');
-                const data = await response.json();
-                console.log('Desktop status:', data);
-            } catch (error) {
-                console.error('Status check failed:', error);
-            }
-        }
-        
-        // Check status every 30 seconds
-        setInterval(checkStatus, 30000);
-        checkStatus();
-    </script>
-</body>
-</html>
-'''
-    
-    with open('/workspace/app/templates/index.html', 'w') as f:
-        f.write(index_html)
-    
-    # Create desktop.html template
-    desktop_html = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Xfce Desktop - HuggingFace Spaces</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: #1a1a1a;
-            overflow: hidden;
-        }
-        
-        .toolbar {
-            background: linear-gradient(90deg, #1a1a2e, #16213e);
-            padding: 10px 20px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            border-bottom: 1px solid #333;
-        }
-        
-        .toolbar-title {
-            color: #fff;
-            font-size: 1.1em;
-        }
-        
-        .toolbar-links {
-            display: flex;
-            gap: 15px;
-        }
-        
-        .toolbar-links a {
-            color: #00d4ff;
-            text-decoration: none;
-            padding: 8px 16px;
-            border-radius: 6px;
-            background: rgba(0, 212, 255, 0.1);
-            transition: all 0.3s;
-        }
-        
-        .toolbar-links a:hover {
-            background: rgba(0, 212, 255, 0.2);
-        }
-        
-        .vnc-container {
-            width: 100vw;
-            height: calc(100vh - 50px);
-            background: #000;
-        }
-        
-        .vnc-container iframe {
-            width: 100%;
-            height: 100%;
-            border: none;
-        }
-        
-        .loading {
-            position: fixed;
-            top: 50%;
-            left: 50%;
-            transform: translate(-50%, -50%);
-            color: #fff;
-            font-size: 1.5em;
-            text-align: center;
-        }
-        
-        .spinner {
-            border: 4px solid rgba(255, 255, 255, 0.1);
-            border-left-color: #00d4ff;
-            border-radius: 50%;
-            width: 50px;
-            height: 50px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 20px;
-        }
-        
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-        
-        .controls {
-            position: fixed;
-            bottom: 20px;
-            right: 20px;
-            display: flex;
-            flex-direction: column;
-            gap: 10px;
-            z-index: 1000;
-        }
-        
-        .control-btn {
-            background: rgba(0, 212, 255, 0.9);
-            color: #000;
-            border: none;
-            padding: 12px 20px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-weight: bold;
-            transition: all 0.3s;
-        }
-        
-        .control-btn:hover {
-            background: #00d4ff;
-            transform: scale(1.05);
-        }
-        
-        .status-bar {
-            position: fixed;
-            bottom: 0;
-            left: 0;
-            right: 0;
-            background: rgba(0, 0, 0, 0.8);
-            color: #00ff88;
-            padding: 8px 20px;
-            font-size: 0.9em;
-            display: flex;
-            justify-content: space-between;
-        }
-    </style>
-</head>
-<body>
-    <div class="toolbar">
-        <div class="toolbar-title">🖥️ Xfce Desktop Environment</div>
-        <div class="toolbar-links">
-            <a href="/">← Back to Home</a>
-            <a href="/terminal">Terminal</a>
-        </div>
-    </div>
-    
-    <div class="vnc-container">
-        <div class="loading" id="loading">
-            <div class="spinner"></div>
-            <p>Connecting to desktop...</p>
-        </div>
-        <iframe id="vnc-frame" style="display: none;" src="/novnc/vnc.html?host=localhost&port=6080"></iframe>
-    </div>
-    
-    <div class="controls">
-        <button class="control-btn" onclick="toggleFullscreen()">⛶ Fullscreen</button>
-        <button class="control-btn" onclick="reloadDesktop()">↻ Reload</button>
-    </div>
-    
-    <div class="status-bar">
-        <span id="connection-status">Connecting...</span>
-        <span>Xfce4 Desktop | HuggingFace Spaces</span>
-    </div>
-    
-    <script>
-        const vncFrame = document.getElementById('vnc-frame');
-        const loading = document.getElementById('loading');
-        const status = document.getElementById('connection-status');
-        
-        // Show iframe when loaded
-        vncFrame.onload = function() {
-            loading.style.display = 'none';
-            vncFrame.style.display = 'block';
-            status.textContent = 'Connected';
-        };
-        
-        // Handle connection errors
-        vncFrame.onerror = function() {
-            status.textContent = 'Connection failed';
-            loading.innerHTML = '<p>Failed to connect. Please refresh.</p>';
-        };
-        
-        function toggleFullscreen() {
-            if (!document.fullscreenElement) {
-                document.documentElement.requestFullscreen();
-            } else {
-                document.exitFullscreen();
-            }
-        }
-        
-        function reloadDesktop() {
-            vncFrame.src = vncFrame.src;
-            loading.style.display = 'block';
-            vncFrame.style.display = 'none';
-        }
-        
-        // Auto-reload on disconnect
-        setTimeout(() => {
-            if (loading.style.display !== 'none') {
-                status.textContent = 'Retrying connection...';
-            }
-        }, 10000);
-    </script>
-</body>
-</html>
-'''
-    
-    with open('/workspace/app/templates/desktop.html', 'w') as f:
-        f.write(desktop_html)
-    
-    # Create terminal.html template
-    terminal_html = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Terminal - HuggingFace Spaces</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: #1a1a1a;
-            height: 100vh;
-            display: flex;
-            flex-direction: column;
-        }
-        
-        .toolbar {
-            background: linear-gradient(90deg, #1a1a2e, #16213e);
-            padding: 10px 20px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            border-bottom: 1px solid #333;
-        }
-        
-        .toolbar-title {
-            color: #fff;
-            font-size: 1.1em;
-        }
-        
-        .toolbar-links a {
-            color: #00d4ff;
-            text-decoration: none;
-            padding: 8px 16px;
-            border-radius: 6px;
-            background: rgba(0, 212, 255, 0.1);
-            transition: all 0.3s;
-        }
-        
-        .toolbar-links a:hover {
-            background: rgba(0, 212, 255, 0.2);
-        }
-        
-        .terminal-container {
-            flex: 1;
-            background: #000;
-            padding: 20px;
-            overflow: auto;
-        }
-        
-        .terminal-container iframe {
-            width: 100%;
-            height: 100%;
-            border: none;
-            border-radius: 8px;
-        }
-    </style>
-</head>
-<body>
-    <div class="toolbar">
-        <div class="toolbar-title">⌨️ Web Terminal</div>
-        <div class="toolbar-links">
-            <a href="/">← Back to Home</a>
-            <a href="/desktop">Desktop</a>
-        </div>
-    </div>
-    
-    <div class="terminal-container">
-        <iframe src="/terminal.html"></iframe>
-    </div>
-</body>
-</html>
-'''
-    
-    with open('/workspace/app/templates/terminal.html', 'w') as f:
-        f.write(terminal_html)
+def _handle_exit_signal(signum, frame):
+    """Exit normally on SIGTERM/SIGINT so atexit cleanup runs"""
+    sys.exit(0)
 
 
 if __name__ == '__main__':
     log_message("Starting Xfce Desktop Environment for HuggingFace Spaces...")
     
-    # Create template files
-    create_template_files()
+    signal.signal(signal.SIGTERM, _handle_exit_signal)
+    signal.signal(signal.SIGINT, _handle_exit_signal)
+    
+    # Desktop supervisor started by gunicorn.conf.py: own the desktop processes
+    # until told to stop
+    if '--desktop' in sys.argv[1:]:
+        start_desktop_environment()
+        while True:
+            signal.pause()
     
     # Start desktop environment in background thread
     desktop_thread = threading.Thread(target=start_desktop_environment, daemon=True)
     desktop_thread.start()
     
-    # Wait a bit for desktop to initialize
-    time.sleep(5)
-    
-    # Run Flask app
+    # Run Flask development server (production uses gunicorn.conf.py)
     log_message("Starting Flask web server...")
     app.run(host='0.0.0.0', port=7860, debug=False, threaded=True)
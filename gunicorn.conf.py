@@ -0,0 +1,36 @@
+"""
+Gunicorn configuration for the Xfce Desktop web interface
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# nginx listens on 7860 and proxies to this address
+bind = "127.0.0.1:8000"
+# Uvicorn workers run the ASGI app on uvloop with the httptools parser
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Process that owns the desktop tree
+desktop_process = None
+
+
+def on_starting(server):
+    """Start the desktop supervisor once, as the master's only non-worker child"""
+    global desktop_process
+    # The master reaps every child as if it were a worker, so the desktop
+    # processes must not be its direct children
+    desktop_process = subprocess.Popen([sys.executable, "-m", "app.main", "--desktop"])
+
+
+def on_exit(server):
+    """Stop the desktop supervisor, which tears down the desktop tree"""
+    if desktop_process is None or desktop_process.poll() is not None:
+        return
+    desktop_process.terminate()
+    try:
+        desktop_process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        desktop_process.kill()